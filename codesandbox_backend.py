@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, session, render_template_string, send_from_directory
+from flask import Flask, request, jsonify, session, render_template_string, send_from_directory, Response, stream_with_context
 import subprocess
 import tempfile
 import os
@@ -13,58 +13,235 @@ import resource
 import html
 import uuid
 import re
-from functools import wraps
+import threading
+import _thread
+import queue
+import gzip
+from functools import wraps, partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)  # Secure random secret key
 
-# Configuration
+# Configuration (defaults for execution profiles that don't override them)
 TIMEOUT_SECONDS = 5
 MAX_MEMORY_MB = 50
 MAX_OUTPUT_SIZE = 10 * 1024  # 10KB
+SAFE_MODULES = ['math', 'random', 'json', 're', 'datetime', 'time']
+PROFILE_TOP_N = 20  # Functions listed in a profiling report
+PROFILE_WORKERS = 4  # Executor pool size per profile
+EXECUTION_PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'execution_profiles.json')
 SESSION_TIMEOUT_MINUTES = 30
+SESSION_REFRESH_SECONDS = 60  # Extend a session's expiry at most this often
+BOOTSTRAP_APPS_PAGE_SIZE = 20  # Apps included in the /bootstrap response
 SANDBOX_BASE_DIR = '/tmp/sandbox'
 HTML_OUTPUT_DIR = '/tmp/html_outputs'  # Directory for HTML outputs
+BYTECODE_CACHE_DIR = '/tmp/app_bytecode'  # Precompiled saved apps
+BYTECODE_SWEEP_GRACE_SECONDS = 300  # Unreferenced cache files compiled or used more recently are kept
+COMPRESS_MIN_SIZE = 1024  # Smaller JSON bodies are sent uncompressed
+COMPRESS_LEVEL = 6  # gzip level for responses compressed on the fly
+STORAGE_COMPRESS_LEVEL = 9  # gzip level for files written once and read many times
+EXECUTION_LOG_FILE = '/tmp/sandbox_logs/executions.jsonl'  # One JSON record per run
+EXECUTION_LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log at this size
+EXECUTION_LOG_BACKUPS = 5  # Rotated files kept as executions.jsonl.1 ... .5
+EXECUTION_LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking /run
+SHUTDOWN_DRAIN_SECONDS = 25  # On SIGTERM, in-flight runs get this long before being killed
+SHUTDOWN_KILL_GRACE_SECONDS = 2  # Time for killed runs to send their responses
 
 # App configuration
 DEMO_MODE = False  # Set to True to enable demo mode restrictions
 ALLOW_PASSWORD_CHANGE = True  # Set to False to disable password changes
 ALLOW_USER_REGISTRATION = False  # Set to True to allow new user registration
 
-# Create HTML output directory
+# Create HTML output, bytecode cache and log directories
 os.makedirs(HTML_OUTPUT_DIR, exist_ok=True)
+os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+os.makedirs(os.path.dirname(EXECUTION_LOG_FILE), exist_ok=True)
 
 # Store user sessions and sandboxes
 user_sessions = {}
 user_sandboxes = {}
 
+# In-flight work, tracked so SIGTERM can drain it
+shutting_down = threading.Event()
+active_runs = 0  # /run requests currently being handled
+active_processes = {}  # {pid: user sandbox dir} for running child interpreters
+active_runs_condition = threading.Condition()
+
 # Apps storage for each user
-user_apps = {}  # {user_id: {app_id: {name, code, created_at, is_html}}}
-APPS_STORAGE_FILE = '/tmp/user_apps.json'
+user_apps = {}  # {user_id: {app_id: {name, code, created_at, is_html, bytecode_key}}}
+APPS_STORAGE_FILE = '/tmp/user_apps.json.gz'
+LEGACY_APPS_STORAGE_FILE = '/tmp/user_apps.json'  # Uncompressed store from older versions
+
+# Per-user change counters behind the apps ETags; the salt keeps ETags from matching across restarts
+user_apps_versions = {}  # {user_id: int}
+APPS_ETAG_SALT = uuid.uuid4().hex[:8]
+
+def apps_etag(user_id):
+    """ETag value for the current state of a user's apps"""
+    return f"{APPS_ETAG_SALT}-{user_apps_versions.get(user_id, 0)}"
+
+def mark_apps_changed(user_id):
+    """Invalidate a user's apps ETags after a save, update, delete or import"""
+    user_apps_versions[user_id] = user_apps_versions.get(user_id, 0) + 1
 
 def load_user_apps():
     """Load user apps from file"""
     global user_apps
     try:
         if os.path.exists(APPS_STORAGE_FILE):
-            with open(APPS_STORAGE_FILE, 'r') as f:
+            with gzip.open(APPS_STORAGE_FILE, 'rt', encoding='utf-8') as f:
+                user_apps = json.load(f)
+        elif os.path.exists(LEGACY_APPS_STORAGE_FILE):
+            with open(LEGACY_APPS_STORAGE_FILE, 'r') as f:
                 user_apps = json.load(f)
     except Exception as e:
         print(f"Error loading user apps: {e}")
         user_apps = {}
 
 def save_user_apps():
-    """Save user apps to file"""
+    """Save user apps to file (gzip-compressed at rest)"""
     try:
-        with open(APPS_STORAGE_FILE, 'w') as f:
-            json.dump(user_apps, f, indent=2)
+        with gzip.open(APPS_STORAGE_FILE, 'wt', encoding='utf-8', compresslevel=STORAGE_COMPRESS_LEVEL) as f:
+            json.dump(user_apps, f)
     except Exception as e:
         print(f"Error saving user apps: {e}")
 
 # Load existing apps on startup
 load_user_apps()
 
+# Execution profiles: named limits and module allowlists, each with its own executor pool
+execution_profiles = {}  # {name: {name, timeout_seconds, max_memory_mb, max_output_size, modules, workers}}
+execution_pools = {}  # {name: ThreadPoolExecutor}
+DEFAULT_PROFILE = 'standard'
+ALLOWED_PROFILES = ['standard']  # Profiles non-admin users may pick (admin policy via /app-settings)
+
+def make_profile(name, config):
+    """Build an execution profile from its config, using module defaults for missing limits"""
+    modules = list(config.get('modules', SAFE_MODULES))
+    # Module names are rendered into the sandbox template, so only plain identifiers are allowed
+    if not all(isinstance(module, str) and module.isidentifier() for module in modules):
+        raise ValueError(f"Invalid module allowlist in profile {name!r}")
+    
+    return {
+        'name': name,
+        'timeout_seconds': int(config.get('timeout_seconds', TIMEOUT_SECONDS)),
+        'max_memory_mb': int(config.get('max_memory_mb', MAX_MEMORY_MB)),
+        'max_output_size': int(config.get('max_output_size', MAX_OUTPUT_SIZE)),
+        'modules': modules,
+        'workers': max(1, int(config.get('workers', PROFILE_WORKERS)))
+    }
+
+def load_execution_profiles():
+    """Load execution profiles from file and start an executor pool for each"""
+    global DEFAULT_PROFILE, ALLOWED_PROFILES
+    config = {}
+    profiles = {}
+    try:
+        if os.path.exists(EXECUTION_PROFILES_FILE):
+            with open(EXECUTION_PROFILES_FILE, 'r') as f:
+                config = json.load(f)
+        for name, profile_config in config.get('profiles', {}).items():
+            profiles[name] = make_profile(name, profile_config)
+    except Exception as e:
+        print(f"Error loading execution profiles: {e}")
+        config = {}
+        profiles = {}
+    
+    # Without a usable config everything runs under the module defaults
+    if not profiles:
+        profiles = {'standard': make_profile('standard', {})}
+    
+    execution_profiles.clear()
+    execution_profiles.update(profiles)
+    
+    DEFAULT_PROFILE = config.get('default_profile')
+    if DEFAULT_PROFILE not in profiles:
+        DEFAULT_PROFILE = next(iter(profiles))
+    ALLOWED_PROFILES = [name for name in config.get('allowed_profiles', list(profiles)) if name in profiles]
+    if DEFAULT_PROFILE not in ALLOWED_PROFILES:
+        ALLOWED_PROFILES.append(DEFAULT_PROFILE)
+    
+    for name, profile in profiles.items():
+        execution_pools[name] = ThreadPoolExecutor(max_workers=profile['workers'], thread_name_prefix=f"exec-{name}")
+
+def available_profiles(user_id):
+    """Names of the execution profiles a user may pick"""
+    if user_id == 'admin':
+        return list(execution_profiles)
+    return [name for name in ALLOWED_PROFILES if name in execution_profiles]
+
+def resolve_profile(user_id, name):
+    """Look up the requested execution profile; returns (profile, error message)"""
+    name = name or DEFAULT_PROFILE
+    if name not in execution_profiles:
+        return None, f'Unknown execution profile "{name}"'
+    if name not in available_profiles(user_id):
+        return None, f'Execution profile "{name}" is not allowed'
+    return execution_profiles[name], None
+
+load_execution_profiles()
+
+# Execution log: /run only enqueues records, a background thread does the file I/O
+execution_log_queue = queue.Queue(maxsize=EXECUTION_LOG_QUEUE_SIZE)
+execution_log_dropped = 0
+
+def log_execution(record):
+    """Queue an execution record for the log writer without ever blocking"""
+    global execution_log_dropped
+    try:
+        execution_log_queue.put_nowait(record)
+    except queue.Full:
+        execution_log_dropped += 1
+
+def rotate_execution_log():
+    """Shift executions.jsonl -> .1 -> .2 ..., dropping the oldest backup"""
+    for index in range(EXECUTION_LOG_BACKUPS - 1, 0, -1):
+        source = f"{EXECUTION_LOG_FILE}.{index}"
+        if os.path.exists(source):
+            os.replace(source, f"{EXECUTION_LOG_FILE}.{index + 1}")
+    if os.path.exists(EXECUTION_LOG_FILE):
+        os.replace(EXECUTION_LOG_FILE, f"{EXECUTION_LOG_FILE}.1")
+
+def execution_log_writer():
+    """Append queued records to the log as JSON lines until a None record arrives"""
+    running = True
+    while running:
+        records = [execution_log_queue.get()]
+        # Write whatever else is already queued in the same batch
+        while len(records) < 1000:
+            try:
+                records.append(execution_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if None in records:
+            running = False
+            records = [record for record in records if record is not None]
+        
+        try:
+            with open(EXECUTION_LOG_FILE, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                size = f.tell()
+            if size >= EXECUTION_LOG_MAX_BYTES:
+                rotate_execution_log()
+        except Exception as e:
+            print(f"Error writing execution log: {e}")
+
+def stop_execution_log():
+    """Flush queued records and stop the log writer"""
+    while True:
+        try:
+            execution_log_queue.put(None, timeout=1)
+            break
+        except queue.Full:
+            continue
+    execution_log_thread.join(timeout=5)
+
+execution_log_thread = threading.Thread(target=execution_log_writer, name='execution-log', daemon=True)
+execution_log_thread.start()
+
 # Simple user store (in production, use a proper database)
 USERS = {
     'admin': '8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918',  # 'admin'
@@ -85,12 +262,42 @@ def require_login(f):
             session.clear()
             return jsonify({'error': 'Session expired'}), 401
             
-        # Refresh session
-        user_sessions[session['user_id']]['expires'] = datetime.now() + timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+        # Refresh session, at most once per SESSION_REFRESH_SECONDS
+        new_expiry = datetime.now() + timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+        if new_expiry - user_session['expires'] >= timedelta(seconds=SESSION_REFRESH_SECONDS):
+            user_session['expires'] = new_expiry
         
         return f(*args, **kwargs)
     return decorated_function
 
+def release_in_flight():
+    """Mark one in-flight run as finished and wake up a draining shutdown"""
+    global active_runs
+    with active_runs_condition:
+        active_runs -= 1
+        active_runs_condition.notify_all()
+
+def track_in_flight(f):
+    """Refuse new runs during shutdown and count a run as in flight until its response is sent"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        global active_runs
+        if shutting_down.is_set():
+            return jsonify({'output': 'Server is shutting down, please try again shortly'}), 503
+        
+        with active_runs_condition:
+            active_runs += 1
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except BaseException:
+            release_in_flight()
+            raise
+        
+        # Released once the body has been written, so shutdown doesn't cut the response off
+        response.call_on_close(release_in_flight)
+        return response
+    return decorated_function
+
 def create_user_sandbox(user_id):
     """Create an isolated sandbox directory for a user"""
     sandbox_dir = f"/tmp/sandbox_{user_id}_{int(time.time())}"
@@ -112,32 +319,24 @@ def cleanup_user_sandbox(user_id):
         sandbox_dir = user_sandboxes[user_id]['dir']
         if os.path.exists(sandbox_dir):
             shutil.rmtree(sandbox_dir, ignore_errors=True)
-        del user_sandboxes[user_id]
+        user_sandboxes.pop(user_id, None)
 
-def set_resource_limits():
+def set_resource_limits(profile):
     """Set resource limits for the subprocess"""
+    max_memory = profile['max_memory_mb'] * 1024 * 1024
+    timeout = profile['timeout_seconds']
     # Limit memory usage
-    resource.setrlimit(resource.RLIMIT_AS, (MAX_MEMORY_MB * 1024 * 1024, MAX_MEMORY_MB * 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
     # Limit CPU time
-    resource.setrlimit(resource.RLIMIT_CPU, (TIMEOUT_SECONDS, TIMEOUT_SECONDS))
+    resource.setrlimit(resource.RLIMIT_CPU, (timeout, timeout))
     # Prevent file creation beyond temp directory
     resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))  # 1MB max file size
 
-def secure_exec(code, sandbox_dir):
-    """Execute code in a secure sandboxed environment"""
-    # Properly indent user code for the try block
-    indented_code = '\n'.join('    ' + line if line.strip() else line for line in code.split('\n'))
-    
-    # Create a restricted Python code template
-    restricted_code = f"""
+# Wrapper module every snippet runs inside; the placeholders are filled in from the profile and code
+RESTRICTED_CODE_TEMPLATE = """
 import sys
 import signal
-import math
-import random
-import json
-import re
-import datetime
-import time
+{module_imports}
 
 # Restrict builtins to safe functions only
 safe_builtins = {{
@@ -155,8 +354,7 @@ safe_builtins = {{
     'StopIteration': StopIteration, 'RuntimeError': RuntimeError,
     'NotImplementedError': NotImplementedError,
     # Safe modules
-    'math': math, 'random': random, 'json': json, 're': re,
-    'datetime': datetime, 'time': time
+    {safe_modules}
 }}
 
 # Restrict access to dangerous functions
@@ -170,7 +368,7 @@ for module in list(sys.modules.keys()):
             del sys.modules[module]
 
 # Set alarm for timeout
-signal.alarm({TIMEOUT_SECONDS})
+signal.alarm({timeout})
 
 try:
 {indented_code}
@@ -178,41 +376,410 @@ except Exception as e:
     print(f"Error: {{type(e).__name__}}: {{e}}")
 """
 
-    # Write code to temp file in sandbox
-    temp_file = os.path.join(sandbox_dir, f"code_{int(time.time())}.py")
+# Child-side driver for profiled runs. The wrapper runs in a separate __main__ namespace on a
+# new thread, started from a helper whose globals hold no usable builtins and whose locals hold only
+# the user's own code and namespace, so walking frames up from user code never reaches the
+# driver, the profiler or the report marker. A trace hook on the wrapper's frame switches the
+# profiler on at the first user line and removes itself, so the wrapper's setup is not
+# profiled. The sys hooks that return the profiler or other threads' frames are removed.
+# Objects can still be found through gc, as for any run in this sandbox. Only the C profiler
+# is imported, never cProfile/pstats; json is imported after the user code has run.
+PROFILER_DRIVER = """
+def _execute(settrace, tracer, run, code, namespace, errors, finished):
+    settrace(tracer)
+    del settrace, tracer
+    try:
+        run(code, namespace)
+    except BaseException as error:
+        # A store, not a call, so the profiler still running on this thread records nothing
+        errors[:] = [error]
+    finally:
+        finished()
+
+def _run(path, marker, line_offset, top_n):
+    import builtins, sys, _thread
+    from _lsprof import Profiler
+    from time import perf_counter
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+    sys.argv[:] = [path]
+    # The wrapper hands user code sys, so drop the hooks that would lead back to the driver
+    del sys.getprofile, sys.setprofile, sys._current_frames
+    main = type(sys)('__main__')
+    main.__file__ = path
+    main.__builtins__ = builtins
+    sys.modules['__main__'] = main
+    profiler = Profiler()
+    started = []
+    def start_profiling(frame, event, arg):
+        if frame.f_code is not code:
+            return None
+        if event == 'line' and frame.f_lineno > int(line_offset):
+            sys.settrace(None)
+            frame.f_trace = None
+            started.append(perf_counter())
+            profiler.enable()
+            return None
+        return start_profiling
+    errors = []
+    finished = _thread.allocate_lock()
+    finished.acquire()
+    execute = type(_execute)(_execute.__code__, {'__builtins__': {'BaseException': BaseException}})
+    _thread.start_new_thread(execute, (sys.settrace, start_profiling, exec, code, main.__dict__,
+                                       errors, finished.release))
+    finished.acquire()
+    total = perf_counter() - started[0] if started else 0.0
+    rows = []
+    for entry in profiler.getstats():
+        if isinstance(entry.code, str):
+            # The helper's release of the lock is not part of the user's code
+            if entry.code == "<method 'release' of '_thread.lock' objects>":
+                continue
+            rows.append(['', 0, entry.code, entry.callcount, entry.totaltime, entry.inlinetime])
+        else:
+            rows.append([entry.code.co_filename, entry.code.co_firstlineno, entry.code.co_name,
+                         entry.callcount, entry.totaltime, entry.inlinetime])
+    rows.sort(key=lambda row: row[4], reverse=True)
+    from json import dumps
+    print(marker + dumps({'total_time': total, 'functions': rows[:int(top_n)]}))
+    # Exit the way a script run would: sys.exit codes and uncaught interrupts still apply
+    if errors:
+        raise errors[0]
+
+_run(*__import__('sys').argv[1:])
+"""
+
+# Child-side compiler for saved apps: reads the wrapper source on stdin and marshals it to argv[1]
+BYTECODE_COMPILER = """
+import marshal, sys
+code_object = compile(sys.stdin.read(), 'app.py', 'exec')
+with open(sys.argv[1], 'wb') as f:
+    marshal.dump(code_object, f)
+"""
+
+# Child-side loader for precompiled apps: runs the marshalled wrapper as a fresh __main__ module,
+# so user code sees the same globals as a script run and none of the loader's own names
+BYTECODE_LOADER = """
+def _run(path):
+    import marshal, sys
+    with open(path, 'rb') as f:
+        code = marshal.load(f)
+    main = type(sys)('__main__')
+    sys.modules['__main__'] = main
+    exec(code, main.__dict__)
+_run(__import__('sys').argv[1])
+"""
+
+def render_restricted_code(code, profile):
+    """Wrap user code in the restricted execution template for a profile"""
+    # Properly indent user code for the try block
+    indented_code = '\n'.join('    ' + line if line.strip() else line for line in code.split('\n'))
+    return RESTRICTED_CODE_TEMPLATE.format(
+        module_imports='\n'.join(f"import {module}" for module in profile['modules']),
+        safe_modules=', '.join(f"'{module}': {module}" for module in profile['modules']),
+        timeout=profile['timeout_seconds'],
+        indented_code=indented_code
+    )
+
+def user_line_offset(source):
+    """Number of wrapper lines before the first line of user code"""
+    return source.count('\n', 0, source.index('\ntry:\n') + 1) + 1
+
+def parse_profile_report(stdout, marker, source_file, line_offset, wall_time, max_size):
+    """Split the profiler report off stdout; returns (stdout, report or None)"""
+    # No report if the code timed out or exited early
+    if marker not in stdout:
+        return stdout, None
+    
+    stdout, _, report_json = stdout.rpartition(marker)
     
     try:
-        with open(temp_file, 'w') as f:
-            f.write(restricted_code)
-        
-        # Execute with restrictions
+        raw_report = json.loads(report_json)
+    except ValueError:
+        return stdout, None
+    
+    functions = []
+    for filename, first_line, name, calls, total_time, own_time in raw_report['functions']:
+        # Drop the driver's own calls and the wrapper around the user code: the module
+        # body only shows up in total_time
+        if '_lsprof.Profiler' in name:
+            continue
+        if filename == source_file and first_line <= line_offset:
+            continue
+        if filename == source_file:
+            name = f"{name} (line {first_line - line_offset})"
+        elif filename:
+            name = f"{name} ({os.path.basename(filename)}:{first_line})"
+        functions.append({
+            'function': name,
+            'calls': calls,
+            'total_time': round(total_time, 6),
+            'own_time': round(own_time, 6)
+        })
+    
+    report = {
+        'total_time': round(raw_report['total_time'], 6),
+        # Wall time includes interpreter start-up and the wrapper, so operators can see its overhead
+        'wall_time': round(wall_time, 6),
+        'functions': functions[:PROFILE_TOP_N]
+    }
+    
+    # Keep the report within the same budget as the output
+    while report['functions'] and len(json.dumps(report)) > max_size:
+        report['functions'].pop()
+    
+    return stdout, report
+
+def app_bytecode_key(code, profile):
+    """Cache key for an app's compiled wrapper: source hash plus interpreter tag"""
+    source_hash = hashlib.sha256(
+        f"{RESTRICTED_CODE_TEMPLATE}\0{profile['timeout_seconds']}\0{','.join(profile['modules'])}\0{code}".encode()
+    ).hexdigest()
+    return f"{source_hash}.{sys.implementation.cache_tag}"
+
+def app_bytecode_path(key):
+    """Location of a cached code object on disk"""
+    return os.path.join(BYTECODE_CACHE_DIR, f"{key}.marshal")
+
+def compile_app_bytecode(code, profile):
+    """Compile an app's wrapper once and store the marshalled code object.
+
+    The compile runs in a child interpreter under the profile's resource limits,
+    like the code itself. Returns the cache key, or None if the code does not
+    compile within them (the normal source path will then report the error
+    when the app is run).
+    """
+    key = app_bytecode_key(code, profile)
+    path = app_bytecode_path(key)
+    if os.path.exists(path):
+        return key
+
+    # Written to a temp file first so a concurrent run never sees a partial object
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
         result = subprocess.run(
-            [sys.executable, temp_file],
+            [sys.executable, '-c', BYTECODE_COMPILER, temp_path],
+            input=render_restricted_code(code, profile),
             capture_output=True,
             text=True,
-            timeout=TIMEOUT_SECONDS,
-            cwd=sandbox_dir,
-            preexec_fn=set_resource_limits,
-            env={'PATH': '/usr/bin:/bin', 'PYTHONPATH': ''}  # Minimal environment
+            timeout=profile['timeout_seconds'],
+            preexec_fn=partial(set_resource_limits, profile),
+            env={'PATH': '/usr/bin:/bin', 'PYTHONPATH': ''}
         )
+        if result.returncode != 0:
+            return None
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Error caching app bytecode: {e}")
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+    return key
+
+def sweep_app_bytecode():
+    """Remove cached code objects that no saved app refers to any more
+
+    Identical code shares one file across apps and users, so files are only
+    removed here, never when a single app is edited or deleted. Files compiled
+    or used within the grace period are kept for in-progress saves and runs.
+    """
+    referenced = {
+        app_data.get('bytecode_key')
+        for apps in user_apps.values()
+        for app_data in apps.values()
+    }
+    cutoff = time.time() - BYTECODE_SWEEP_GRACE_SECONDS
+    removed = 0
+    for filename in os.listdir(BYTECODE_CACHE_DIR):
+        key = filename[:-len('.marshal')] if filename.endswith('.marshal') else None
+        if key in referenced:
+            continue
+        path = os.path.join(BYTECODE_CACHE_DIR, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def load_app_bytecode(app_data, profile):
+    """Return the path of an app's precompiled code object, rebuilding it if stale"""
+    key = app_bytecode_key(app_data['code'], profile)
+    path = app_bytecode_path(key)
+    if app_data.get('bytecode_key') == key and os.path.exists(path):
+        # Mark the file as in use so a sweep during this run keeps it
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+    # Missing, built by another interpreter or for an older template: recompile
+    app_data['bytecode_key'] = compile_app_bytecode(app_data['code'], profile)
+    if app_data['bytecode_key']:
+        return app_bytecode_path(app_data['bytecode_key'])
+    return None
+
+def kill_process_group(pid):
+    """Kill a child interpreter and anything it spawned; returns False if it had already exited
+
+    secure_exec drops the pid from active_processes under the same lock before
+    reaping the child, so a pid that is still listed cannot have been reused.
+    """
+    with active_runs_condition:
+        if pid not in active_processes:
+            return False
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        return True
+
+def read_capture(f, limit=None):
+    """Read back a captured output file, at most limit characters"""
+    f.seek(0)
+    return f.read(limit) if limit is not None else f.read()
+
+def secure_exec(code, sandbox_dir, bytecode_path=None, profile=None, profiling=False):
+    """Execute code in a secure sandboxed environment
+
+    Limits and the module allowlist come from the execution profile (the
+    default profile if none is given). If bytecode_path points at a
+    precompiled wrapper for this code, the child loads it directly instead
+    of rendering and compiling the source again.
+
+    Returns a dict with the output, the profile report (None unless
+    profiling was requested and the code ran to completion) and the run's
+    duration, CPU time, exit reason and raw output size for the execution log.
+    """
+    profile = profile or execution_profiles[DEFAULT_PROFILE]
+    timeout = profile['timeout_seconds']
+    max_output_size = profile['max_output_size']
+    profiling_marker = f"__sandbox_profile_{uuid.uuid4().hex}__" if profiling else None
+    execution = {
+        'output': '',
+        'profile_report': None,
+        'exit_reason': 'system_error',
+        'duration': 0.0,
+        'cpu_time': 0.0,
+        'output_size': 0
+    }
+    
+    # Jobs still queued in an executor pool when shutdown starts are not started
+    if shutting_down.is_set():
+        execution['exit_reason'] = 'shutdown'
+        execution['output'] = "Error: Server is shutting down, please run your code again"
+        return execution
+    
+    # Profiled runs report line numbers against the source, so they never use the cached object
+    if bytecode_path and not profiling:
+        command = [sys.executable, '-c', BYTECODE_LOADER, bytecode_path]
+        temp_file = None
+    else:
+        # Write code to temp file in sandbox
+        temp_file = os.path.join(sandbox_dir, f"code_{uuid.uuid4().hex}.py")
+        command = [sys.executable, temp_file]
+
+    try:
+        if temp_file:
+            source = render_restricted_code(code, profile)
+            with open(temp_file, 'w') as f:
+                f.write(source)
+            if profiling:
+                # A couple of extra rows cover the driver and wrapper entries the report drops
+                command = [sys.executable, '-c', PROFILER_DRIVER, temp_file, profiling_marker,
+                           str(user_line_offset(source)), str(PROFILE_TOP_N + 2)]
         
-        output = result.stdout
-        if result.stderr:
-            output += "\nErrors:\n" + result.stderr
+        # Output is captured to unlinked files rather than pipes: the parent reads back
+        # only what it returns, and can reap the child itself to get its CPU usage
+        with tempfile.TemporaryFile('w+', encoding='utf-8', errors='replace', dir=sandbox_dir) as stdout_file, \
+                tempfile.TemporaryFile('w+', encoding='utf-8', errors='replace', dir=sandbox_dir) as stderr_file:
+            # Execute with restrictions
+            started = time.perf_counter()
+            # Each child leads its own process group so timeouts and shutdown kill everything it started
+            process = subprocess.Popen(
+                command,
+                stdout=stdout_file,
+                stderr=stderr_file,
+                cwd=sandbox_dir,
+                preexec_fn=partial(set_resource_limits, profile),
+                start_new_session=True,
+                env={'PATH': '/usr/bin:/bin', 'PYTHONPATH': ''}  # Minimal environment
+            )
+            with active_runs_condition:
+                active_processes[process.pid] = sandbox_dir
+            timed_out = threading.Event()
             
-        # Limit output size
-        if len(output) > MAX_OUTPUT_SIZE:
-            output = output[:MAX_OUTPUT_SIZE] + f"\n... (output truncated, max {MAX_OUTPUT_SIZE} characters)"
+            def kill_on_timeout():
+                # A child that exited just as the timer fired finished normally, not by timeout.
+                # Holding the lock means the flag is set before the run is marked as finished.
+                with active_runs_condition:
+                    if kill_process_group(process.pid):
+                        timed_out.set()
+            
+            timer = threading.Timer(timeout, kill_on_timeout)
+            timer.start()
+            try:
+                # Wait for the exit without reaping, so the pid stays reserved until no kill can target it
+                os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            finally:
+                timer.cancel()
+                with active_runs_condition:
+                    active_processes.pop(process.pid, None)
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            
+            execution['duration'] = time.perf_counter() - started
+            execution['cpu_time'] = rusage.ru_utime + rusage.ru_stime
+            execution['output_size'] = os.fstat(stdout_file.fileno()).st_size + os.fstat(stderr_file.fileno()).st_size
+            
+            if timed_out.is_set():
+                execution['exit_reason'] = 'timeout'
+                execution['output'] = f"Error: Code execution timed out after {timeout} seconds"
+                return execution
             
-        return output
+            if shutting_down.is_set() and -process.returncode == signal.SIGKILL:
+                execution['exit_reason'] = 'shutdown'
+                execution['output'] = "Error: Code execution stopped because the server is shutting down"
+                return execution
+            
+            if process.returncode == 0:
+                execution['exit_reason'] = 'ok'
+            elif process.returncode > 0:
+                execution['exit_reason'] = 'error'
+            elif -process.returncode in (signal.SIGALRM, signal.SIGXCPU):
+                execution['exit_reason'] = 'timeout'
+            else:
+                # Killed by a resource limit (memory, file size) or another signal
+                execution['exit_reason'] = 'killed'
+            
+            # The profiler report sits at the end of stdout, so profiled runs read all of it
+            output = read_capture(stdout_file, None if profiling else max_output_size + 1)
+            if profiling:
+                output, execution['profile_report'] = parse_profile_report(
+                    output, profiling_marker, temp_file, user_line_offset(source),
+                    execution['duration'], max_output_size
+                )
+            stderr = read_capture(stderr_file, max_output_size + 1)
+            if stderr:
+                output += "\nErrors:\n" + stderr
+        
+        # Limit output size
+        if len(output) > max_output_size:
+            output = output[:max_output_size] + f"\n... (output truncated, max {max_output_size} characters)"
+        
+        execution['output'] = output
+        return execution
         
-    except subprocess.TimeoutExpired:
-        return f"Error: Code execution timed out after {TIMEOUT_SECONDS} seconds"
     except Exception as e:
-        return f"Error: {str(e)}"
+        execution['output'] = f"Error: {str(e)}"
+        return execution
     finally:
         # Clean up temp file
-        if os.path.exists(temp_file):
+        if temp_file and os.path.exists(temp_file):
             os.unlink(temp_file)
 
 def detect_html_output(code, output):
@@ -243,54 +810,88 @@ def detect_html_output(code, output):
         
     return False
 
-def extract_html_from_output(output):
-    """Extract HTML content from Python output"""
-    # Look for HTML content in the output
-    html_match = re.search(r'(<!DOCTYPE.*|<html.*|<div.*|<style.*)', output, re.DOTALL | re.IGNORECASE)
-    if html_match:
-        # Try to extract complete HTML document
-        html_content = output[html_match.start():]
-        
-        # Clean up any Python print artifacts
-        html_content = re.sub(r'^[^<]*', '', html_content)
-        html_content = html_content.strip()
-        
-        return html_content
-    
-    # If no HTML tags found but output exists, wrap in basic HTML
-    if output.strip():
-        return f"""<!DOCTYPE html>
+# Earliest tag that marks the start of an HTML document in the output
+HTML_START_PATTERN = re.compile(r'<!DOCTYPE|<html|<div|<style', re.IGNORECASE)
+HTML_WRITE_CHUNK_SIZE = 64 * 1024
+
+# Page used when the output has no HTML of its own; the escaped output goes between the two halves
+HTML_FALLBACK_HEAD = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <title>Sandbox Output</title>
     <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-        .output {{ background-color: #f5f5f5; padding: 15px; border-radius: 5px; }}
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        .output { background-color: #f5f5f5; padding: 15px; border-radius: 5px; }
     </style>
 </head>
 <body>
     <div class="output">
-        <pre>{html.escape(output)}</pre>
+        <pre>"""
+HTML_FALLBACK_TAIL = """</pre>
     </div>
 </body>
 </html>"""
+
+def find_html_start(output):
+    """Return the index where HTML content starts in the output, or -1"""
+    html_match = HTML_START_PATTERN.search(output)
+    return html_match.start() if html_match else -1
+
+def write_html_from_output(f, output, html_start):
+    """Stream the HTML view of the output to f without copying the whole output"""
+    if html_start >= 0:
+        # Write the document from its first tag, dropping trailing whitespace
+        end = len(output)
+        while end > html_start and output[end - 1].isspace():
+            end -= 1
+        for offset in range(html_start, end, HTML_WRITE_CHUNK_SIZE):
+            f.write(output[offset:min(offset + HTML_WRITE_CHUNK_SIZE, end)])
+        return
     
-    return None
+    # If no HTML tags found, wrap the escaped output in basic HTML
+    f.write(HTML_FALLBACK_HEAD)
+    for offset in range(0, len(output), HTML_WRITE_CHUNK_SIZE):
+        f.write(html.escape(output[offset:offset + HTML_WRITE_CHUNK_SIZE]))
+    f.write(HTML_FALLBACK_TAIL)
 
-def save_html_output(user_id, html_content):
-    """Save HTML content and return URL"""
+def save_html_output(user_id, output):
+    """Save the HTML view of the output and return its URL, or None if there is nothing to show"""
+    html_start = find_html_start(output)
+    if html_start < 0 and (not output or output.isspace()):
+        return None
+    
     # Generate unique filename
     file_id = str(uuid.uuid4())
     filename = f"{user_id}_{file_id}.html"
-    filepath = os.path.join(HTML_OUTPUT_DIR, filename)
+    filepath = os.path.join(HTML_OUTPUT_DIR, filename + '.gz')
     
-    # Write HTML content
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    # Write HTML content precompressed; /view serves the .gz as-is to gzip clients
+    with gzip.open(filepath, 'wt', encoding='utf-8', compresslevel=STORAGE_COMPRESS_LEVEL) as f:
+        write_html_from_output(f, output, html_start)
     
     return f"/view/{filename}"
 
+def client_accepts_gzip():
+    """Check whether the current request negotiated gzip Content-Encoding"""
+    return request.accept_encodings.quality('gzip') > 0
+
+@app.after_request
+def compress_response(response):
+    """Gzip large JSON bodies for clients that accept it"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if not client_accepts_gzip() or response.content_length is None \
+            or response.content_length < COMPRESS_MIN_SIZE:
+        return response
+    
+    response.set_data(gzip.compress(response.get_data(), COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 @app.route('/')
 def index():
     if 'user_id' in session and session['user_id'] in user_sessions:
@@ -329,13 +930,34 @@ def logout():
 
 @app.route('/run', methods=['POST'])
 @require_login
+@track_in_flight
 def run_code():
     user_id = session['user_id']
     code = request.json.get('code', '')
+    app_id = request.json.get('app_id')
+    profile_name = request.json.get('profile')
+    profiling = bool(request.json.get('profiling', False))
+    
+    app_data = user_apps.get(user_id, {}).get(app_id) if app_id else None
+    if app_data:
+        if not code.strip():
+            code = app_data['code']
+        # Saved apps run under their own profile unless the request picks one
+        profile_name = profile_name or app_data.get('profile')
     
     if not code.strip():
         return jsonify({'output': 'No code provided'})
     
+    profile, error = resolve_profile(user_id, profile_name)
+    if error:
+        return jsonify({'output': error}), 400
+    
+    # Saved apps run from their precompiled code object when code and profile are unchanged
+    bytecode_path = None
+    if app_data and code.strip() == app_data['code'] \
+            and profile['name'] == app_data.get('profile', DEFAULT_PROFILE):
+        bytecode_path = load_app_bytecode(app_data, profile)
+    
     # Create sandbox if not exists
     if user_id not in user_sandboxes:
         create_user_sandbox(user_id)
@@ -344,17 +966,39 @@ def run_code():
     sandbox_dir = user_sandboxes[user_id]['dir']
     
     try:
-        output = secure_exec(code, sandbox_dir)
+        # Each profile has its own executor pool so heavy jobs can't starve the fast lane
+        execution = execution_pools[profile['name']].submit(
+            secure_exec, code, sandbox_dir, bytecode_path, profile, profiling
+        ).result()
+        output = execution['output']
+        
+        response = {'output': output}
+        if profiling:
+            response['profile_report'] = execution['profile_report']
         
         # Detect and handle HTML output
+        html_url = None
         if detect_html_output(code, output):
-            html_content = extract_html_from_output(output)
-            if html_content:
-                # Save HTML content and return URL
-                html_url = save_html_output(user_id, html_content)
-                return jsonify({'output': 'HTML content generated', 'html_url': html_url})
+            # Stream the HTML view straight to its file and return the URL
+            html_url = save_html_output(user_id, output)
+            if html_url:
+                response.update({'output': 'HTML content generated', 'html_url': html_url})
+        
+        log_execution({
+            'timestamp': datetime.now().isoformat(),
+            'user': user_id,
+            'app_id': app_id if app_data else None,
+            'code_hash': hashlib.sha256(code.encode()).hexdigest()[:16],
+            'profile': profile['name'],
+            'duration': round(execution['duration'], 6),
+            'cpu_time': round(execution['cpu_time'], 6),
+            'exit_reason': execution['exit_reason'],
+            'output_size': execution['output_size'],
+            'html': bool(html_url),
+            'cached': bool(bytecode_path and not profiling)
+        })
         
-        return jsonify({'output': output})
+        return jsonify(response)
     except Exception as e:
         return jsonify({'output': f'System error: {str(e)}'})
 
@@ -366,18 +1010,41 @@ def reset_environment():
     create_user_sandbox(user_id)
     return jsonify({'success': True, 'message': 'Environment reset successfully'})
 
-@app.route('/status')
-@require_login
-def status():
-    user_id = session['user_id']
+def status_payload(user_id):
+    """Session and sandbox status for a user"""
     user_session = user_sessions.get(user_id, {})
     sandbox_info = user_sandboxes.get(user_id, {})
     
-    return jsonify({
+    return {
         'user': user_id,
         'session_expires': user_session.get('expires', '').isoformat() if user_session.get('expires') else '',
         'sandbox_created': bool(sandbox_info),
-        'sandbox_age': int(time.time() - sandbox_info.get('created', 0)) if sandbox_info else 0
+        'sandbox_age': int(time.time() - sandbox_info.get('created', 0)) if sandbox_info else 0,
+        'profiles': available_profiles(user_id),
+        'default_profile': DEFAULT_PROFILE
+    }
+
+@app.route('/status')
+@require_login
+def status():
+    return jsonify(status_payload(session['user_id']))
+
+@app.route('/bootstrap')
+@require_login
+def bootstrap():
+    """Status, settings and the first page of apps in one response for page load"""
+    user_id = session['user_id']
+    apps_list = list_app_summaries(user_id)
+    settings = settings_payload(user_id)
+    
+    return jsonify({
+        'success': True,
+        'status': status_payload(user_id),
+        'settings': settings,
+        'settings_etag': settings_etag(settings),
+        'apps': apps_list[:BOOTSTRAP_APPS_PAGE_SIZE],
+        'apps_total': len(apps_list),
+        'apps_etag': apps_etag(user_id)
     })
 
 @app.route('/view/<filename>')
@@ -389,32 +1056,84 @@ def view_html(filename):
     if not filename.startswith(f"{user_id}_"):
         return "Access denied", 403
     
-    try:
+    # Outputs from older versions were stored uncompressed
+    if os.path.exists(os.path.join(HTML_OUTPUT_DIR, filename)):
         return send_from_directory(HTML_OUTPUT_DIR, filename)
-    except FileNotFoundError:
+    
+    compressed_path = os.path.join(HTML_OUTPUT_DIR, filename + '.gz')
+    if os.path.basename(filename) != filename or not os.path.exists(compressed_path):
         return "File not found", 404
+    
+    if client_accepts_gzip():
+        # gzip_static semantics: hand the stored file over without recompressing
+        response = send_from_directory(HTML_OUTPUT_DIR, filename + '.gz', mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with gzip.open(compressed_path, 'rb') as f:
+            response = Response(f.read(), mimetype='text/html')
+    response.vary.add('Accept-Encoding')
+    return response
+
+def app_summary(app_id, app_data):
+    """List entry for an app (everything but the code)"""
+    return {
+        'id': app_id,
+        'name': app_data['name'],
+        'description': app_data.get('description', ''),
+        'created_at': app_data['created_at'],
+        'is_html': app_data.get('is_html', False),
+        'profile': app_data.get('profile', DEFAULT_PROFILE)
+    }
+
+def list_app_summaries(user_id):
+    """A user's apps in list format for the frontend, newest first"""
+    apps = user_apps.get(user_id, {})
+    apps_list = [app_summary(app_id, app_data) for app_id, app_data in apps.items()]
+    
+    # Sort by creation date (newest first)
+    apps_list.sort(key=lambda x: x['created_at'], reverse=True)
+    return apps_list
+
+def apps_delta(user_id, previous_etag, upserted=(), deleted=()):
+    """Change to a user's app list after a write, so clients can patch their copy
+
+    Clients whose cached list carries previous_etag can adopt apps_etag
+    without fetching the list again.
+    """
+    apps = user_apps.get(user_id, {})
+    return {
+        'upserted': [app_summary(app_id, apps[app_id]) for app_id in upserted],
+        'deleted': list(deleted),
+        'previous_etag': previous_etag,
+        'apps_etag': apps_etag(user_id)
+    }
 
 @app.route('/apps', methods=['GET'])
 @require_login
 def get_apps():
-    """Get list of user's saved apps"""
+    """Get list of user's saved apps
+
+    Supports If-None-Match against the apps ETag and optional
+    limit/offset paging.
+    """
     user_id = session['user_id']
-    apps = user_apps.get(user_id, {})
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'success': False, 'message': 'offset and limit must not be negative'}), 400
     
-    # Convert to list format for frontend
-    apps_list = []
-    for app_id, app_data in apps.items():
-        apps_list.append({
-            'id': app_id,
-            'name': app_data['name'],
-            'description': app_data.get('description', ''),
-            'created_at': app_data['created_at'],
-            'is_html': app_data.get('is_html', False)
-        })
+    etag = apps_etag(user_id)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
     
-    # Sort by creation date (newest first)
-    apps_list.sort(key=lambda x: x['created_at'], reverse=True)
-    return jsonify({'apps': apps_list})
+    apps_list = list_app_summaries(user_id)
+    page = apps_list[offset:offset + limit] if limit is not None else apps_list[offset:]
+    
+    response = jsonify({'apps': page, 'total': len(apps_list), 'offset': offset})
+    response.set_etag(etag, weak=True)
+    return response
 
 @app.route('/apps', methods=['POST'])
 @require_login
@@ -430,6 +1149,10 @@ def save_app():
     if not name or not code:
         return jsonify({'success': False, 'message': 'Name and code are required'}), 400
     
+    profile, error = resolve_profile(user_id, data.get('profile'))
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
     # Generate unique app ID
     app_id = str(uuid.uuid4())
     
@@ -446,13 +1169,126 @@ def save_app():
         'code': code,
         'description': description,
         'created_at': datetime.now().isoformat(),
-        'is_html': is_html
+        'is_html': is_html,
+        'profile': profile['name'],
+        'bytecode_key': compile_app_bytecode(code, profile)
     }
     
     # Save user apps to file
+    previous_etag = apps_etag(user_id)
+    mark_apps_changed(user_id)
     save_user_apps()
     
-    return jsonify({'success': True, 'message': f'App "{name}" saved successfully', 'app_id': app_id})
+    return jsonify({
+        'success': True,
+        'message': f'App "{name}" saved successfully',
+        'app_id': app_id,
+        'delta': apps_delta(user_id, previous_etag, upserted=[app_id])
+    })
+
+@app.route('/apps/export', methods=['GET'])
+@require_login
+def export_apps():
+    """Stream the user's apps as NDJSON, one app per line"""
+    user_id = session['user_id']
+    # Snapshot the ids so concurrent saves can't break iteration mid-stream
+    app_ids = list(user_apps.get(user_id, {}).keys())
+    
+    def generate():
+        apps = user_apps.get(user_id, {})
+        for app_id in app_ids:
+            app_data = apps.get(app_id)
+            if app_data is None:
+                continue
+            yield json.dumps({
+                'id': app_id,
+                'name': app_data['name'],
+                'code': app_data['code'],
+                'description': app_data.get('description', ''),
+                'created_at': app_data['created_at'],
+                'is_html': app_data.get('is_html', False),
+                'profile': app_data.get('profile', DEFAULT_PROFILE)
+            }) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename="{user_id}_apps.ndjson"'
+    return response
+
+@app.route('/apps/import', methods=['POST'])
+@require_login
+def import_apps():
+    """Import an NDJSON archive of apps in a single transaction"""
+    user_id = session['user_id']
+    
+    # Validate every line before touching the store so a bad archive imports nothing
+    staged = {}
+    for line_number, line in enumerate(request.stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return jsonify({'success': False, 'message': f'Line {line_number}: invalid JSON'}), 400
+        
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': f'Line {line_number}: expected an app object'}), 400
+        
+        name = data.get('name')
+        code = data.get('code')
+        if not isinstance(name, str) or not isinstance(code, str) or not name.strip() or not code.strip():
+            return jsonify({'success': False, 'message': f'Line {line_number}: name and code are required'}), 400
+        name, code = name.strip(), code.strip()
+        
+        description = data.get('description') or ''
+        if not isinstance(description, str):
+            return jsonify({'success': False, 'message': f'Line {line_number}: description must be a string'}), 400
+        if not isinstance(data.get('profile') or '', str):
+            return jsonify({'success': False, 'message': f'Line {line_number}: profile must be a string'}), 400
+        
+        profile, error = resolve_profile(user_id, data.get('profile'))
+        if error:
+            return jsonify({'success': False, 'message': f'Line {line_number}: {error}'}), 400
+        
+        # The app list is sorted by created_at, so it must be a real timestamp string
+        created_at = data.get('created_at')
+        if created_at is None or created_at == '':
+            created_at = datetime.now().isoformat()
+        else:
+            try:
+                created_at = datetime.fromisoformat(created_at).isoformat()
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': f'Line {line_number}: invalid created_at'}), 400
+        
+        staged[str(uuid.uuid4())] = {
+            'name': name,
+            'code': code,
+            'description': description.strip(),
+            'created_at': created_at,
+            'is_html': detect_html_output(code, ''),
+            'profile': profile['name']
+        }
+    
+    if not staged:
+        return jsonify({'success': False, 'message': 'No apps found in archive'}), 400
+    
+    # Only compile once the whole archive is known to be good, so a rejected one leaves no cache files
+    for app_data in staged.values():
+        app_data['bytecode_key'] = compile_app_bytecode(app_data['code'], execution_profiles[app_data['profile']])
+    
+    user_apps.setdefault(user_id, {}).update(staged)
+    
+    # One write for the whole archive
+    previous_etag = apps_etag(user_id)
+    mark_apps_changed(user_id)
+    save_user_apps()
+    
+    return jsonify({
+        'success': True,
+        'message': f'Imported {len(staged)} apps',
+        'app_ids': list(staged.keys()),
+        'delta': apps_delta(user_id, previous_etag, upserted=list(staged.keys()))
+    })
 
 @app.route('/apps/<app_id>', methods=['GET'])
 @require_login
@@ -463,8 +1299,15 @@ def get_app(app_id):
     if user_id not in user_apps or app_id not in user_apps[user_id]:
         return jsonify({'success': False, 'message': 'App not found'}), 404
     
+    # Any change to the user's apps invalidates this, which is coarse but costs nothing to check
+    etag = f"{apps_etag(user_id)}-{app_id}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    
     app_data = user_apps[user_id][app_id]
-    return jsonify({
+    response = jsonify({
         'success': True,
         'app': {
             'id': app_id,
@@ -472,9 +1315,12 @@ def get_app(app_id):
             'code': app_data['code'],
             'description': app_data.get('description', ''),
             'created_at': app_data['created_at'],
-            'is_html': app_data.get('is_html', False)
+            'is_html': app_data.get('is_html', False),
+            'profile': app_data.get('profile', DEFAULT_PROFILE)
         }
     })
+    response.set_etag(etag, weak=True)
+    return response
 
 @app.route('/apps/<app_id>', methods=['DELETE'])
 @require_login
@@ -487,11 +1333,18 @@ def delete_app(app_id):
     
     app_name = user_apps[user_id][app_id]['name']
     del user_apps[user_id][app_id]
+    sweep_app_bytecode()
     
     # Save user apps to file
+    previous_etag = apps_etag(user_id)
+    mark_apps_changed(user_id)
     save_user_apps()
     
-    return jsonify({'success': True, 'message': f'App "{app_name}" deleted successfully'})
+    return jsonify({
+        'success': True,
+        'message': f'App "{app_name}" deleted successfully',
+        'delta': apps_delta(user_id, previous_etag, deleted=[app_id])
+    })
 
 @app.route('/apps/<app_id>', methods=['PUT'])
 @require_login
@@ -509,15 +1362,33 @@ def update_app(app_id):
     if not name or not code:
         return jsonify({'success': False, 'message': 'Name and code are required'}), 400
     
-    # Update the app
-    user_apps[user_id][app_id]['name'] = name
-    user_apps[user_id][app_id]['code'] = code
-    user_apps[user_id][app_id]['is_html'] = detect_html_output(code, '')
+    app_data = user_apps[user_id][app_id]
+    profile, error = resolve_profile(user_id, data.get('profile', app_data.get('profile')))
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    # Update the app, recompiling only if the code or profile changed
+    if app_data['code'] != code or app_data.get('profile', DEFAULT_PROFILE) != profile['name'] \
+            or not app_data.get('bytecode_key'):
+        app_data['bytecode_key'] = compile_app_bytecode(code, profile)
+        sweep_app_bytecode()
+    app_data['profile'] = profile['name']
+    app_data['name'] = name
+    app_data['code'] = code
+    app_data['is_html'] = detect_html_output(code, '')
+    if 'description' in data:
+        app_data['description'] = (data.get('description') or '').strip()
     
     # Save user apps to file
+    previous_etag = apps_etag(user_id)
+    mark_apps_changed(user_id)
     save_user_apps()
     
-    return jsonify({'success': True, 'message': f'App "{name}" updated successfully'})
+    return jsonify({
+        'success': True,
+        'message': f'App "{name}" updated successfully',
+        'delta': apps_delta(user_id, previous_etag, upserted=[app_id])
+    })
 
 @app.route('/change-password', methods=['POST'])
 @require_login
@@ -553,22 +1424,39 @@ def change_password():
     
     return jsonify({'success': True, 'message': 'Password changed successfully'})
 
-@app.route('/app-settings', methods=['GET'])
-@require_login
-def get_app_settings():
-    """Get app configuration settings"""
-    user_id = session['user_id']
+def settings_payload(user_id):
+    """App configuration settings as seen by a user"""
     is_admin = user_id == 'admin'  # Only admin can see/change global settings
     
-    settings = {
+    return {
         'demo_mode': DEMO_MODE,
         'allow_password_change': ALLOW_PASSWORD_CHANGE,
         'allow_user_registration': ALLOW_USER_REGISTRATION,
         'is_admin': is_admin,
-        'current_user': user_id
+        'current_user': user_id,
+        'default_profile': DEFAULT_PROFILE,
+        'allowed_profiles': ALLOWED_PROFILES,
+        'execution_profiles': list(execution_profiles.values())
     }
+
+def settings_etag(settings):
+    """ETag value for a settings payload, so clients can revalidate it cheaply"""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+@app.route('/app-settings', methods=['GET'])
+@require_login
+def get_app_settings():
+    """Get app configuration settings"""
+    settings = settings_payload(session['user_id'])
+    etag = settings_etag(settings)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
     
-    return jsonify({'success': True, 'settings': settings})
+    response = jsonify({'success': True, 'settings': settings})
+    response.set_etag(etag, weak=True)
+    return response
 
 @app.route('/app-settings', methods=['POST'])
 @require_login
@@ -580,7 +1468,15 @@ def update_app_settings():
         return jsonify({'success': False, 'message': 'Admin access required'}), 403
     
     data = request.json
-    global DEMO_MODE, ALLOW_PASSWORD_CHANGE, ALLOW_USER_REGISTRATION
+    global DEMO_MODE, ALLOW_PASSWORD_CHANGE, ALLOW_USER_REGISTRATION, ALLOWED_PROFILES
+    
+    if 'allowed_profiles' in data:
+        allowed_profiles = data['allowed_profiles']
+        if not isinstance(allowed_profiles, list) or any(name not in execution_profiles for name in allowed_profiles):
+            return jsonify({'success': False, 'message': 'Unknown execution profile'}), 400
+        if DEFAULT_PROFILE not in allowed_profiles:
+            return jsonify({'success': False, 'message': f'The default profile "{DEFAULT_PROFILE}" must stay allowed'}), 400
+        ALLOWED_PROFILES = list(allowed_profiles)
     
     if 'demo_mode' in data:
         DEMO_MODE = bool(data['demo_mode'])
@@ -596,11 +1492,84 @@ def update_app_settings():
 # Cleanup on exit
 import atexit
 
+def kill_active_executions():
+    """Kill the process group of every running child interpreter; returns how many"""
+    with active_runs_condition:
+        pids = list(active_processes)
+    return sum(kill_process_group(pid) for pid in pids)
+
 def cleanup_all_sandboxes():
-    for user_id in list(user_sandboxes.keys()):
-        cleanup_user_sandbox(user_id)
+    """Remove every sandbox directory, in parallel"""
+    user_ids = list(user_sandboxes.keys())
+    if not user_ids:
+        return 0
+    try:
+        with ThreadPoolExecutor(max_workers=min(8, len(user_ids))) as pool:
+            list(pool.map(cleanup_user_sandbox, user_ids))
+    except RuntimeError:
+        # From atexit, the interpreter no longer starts executor threads
+        for user_id in user_ids:
+            cleanup_user_sandbox(user_id)
+    return len(user_ids)
+
+def drain_executions(deadline_seconds):
+    """Wait for in-flight runs to finish, killing whatever is left at the deadline"""
+    started = time.monotonic()
+    with active_runs_condition:
+        in_flight = active_runs
+        active_runs_condition.wait_for(lambda: active_runs == 0, timeout=deadline_seconds)
+    
+    killed = kill_active_executions()
+    if killed:
+        # Let the killed runs send their responses before the process exits
+        with active_runs_condition:
+            active_runs_condition.wait_for(lambda: active_runs == 0, timeout=SHUTDOWN_KILL_GRACE_SECONDS)
+    drain_seconds = time.monotonic() - started
+    
+    for pool in execution_pools.values():
+        pool.shutdown(wait=False)
+    
+    cleanup_started = time.monotonic()
+    sandboxes_removed = cleanup_all_sandboxes()
+    
+    return {
+        'in_flight': in_flight,
+        'killed': killed,
+        'unfinished': active_runs,
+        'drain_seconds': round(drain_seconds, 3),
+        'sandboxes_removed': sandboxes_removed,
+        'cleanup_seconds': round(time.monotonic() - cleanup_started, 3),
+        'log_records_dropped': execution_log_dropped
+    }
+
+def drain_and_stop():
+    """Drain in-flight runs, then stop the server loop on the main thread"""
+    metrics = drain_executions(SHUTDOWN_DRAIN_SECONDS)
+    print(f"Shutdown drain: {json.dumps(metrics)}", flush=True)
+    # The dev server treats KeyboardInterrupt as a clean stop; atexit handlers run after it returns
+    _thread.interrupt_main()
+
+def handle_sigterm(signum, frame):
+    """Stop accepting runs and drain the in-flight ones off the main thread
+
+    The main thread runs the server's accept loop, so it keeps answering new
+    runs with a 503 while the drain is in progress.
+    """
+    if shutting_down.is_set():
+        return
+    shutting_down.set()
+    threading.Thread(target=drain_and_stop, name='shutdown-drain', daemon=True).start()
+
+# Cache files of apps deleted or edited before the last restart
+sweep_app_bytecode()
 
 atexit.register(cleanup_all_sandboxes)
+atexit.register(kill_active_executions)
+atexit.register(stop_execution_log)
 
 if __name__ == '__main__':
+    # Only the standalone server drains on SIGTERM; importers keep their own handling
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # Background launches inherit SIGINT as ignored, which would turn interrupt_main() into a no-op
+    signal.signal(signal.SIGINT, signal.default_int_handler)
     app.run(host='0.0.0.0', port=5000, debug=False)
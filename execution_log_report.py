@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Query the sandbox execution log (written by codesandbox_backend.py)
+
+Examples:
+    python3 execution_log_report.py users --since 24h
+    python3 execution_log_report.py timeouts --since 7d
+    python3 execution_log_report.py apps --since 1h --top 5
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+EXECUTION_LOG_FILE = '/tmp/sandbox_logs/executions.jsonl'
+EXECUTION_LOG_BACKUPS = 5
+
+def parse_since(value):
+    """Turn '30m', '24h', '7d' or an ISO timestamp into a datetime"""
+    match = re.fullmatch(r'(\d+)([mhd])', value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {'m': timedelta(minutes=amount), 'h': timedelta(hours=amount), 'd': timedelta(days=amount)}[unit]
+        return datetime.now() - delta
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time window: {value!r}")
+
+def read_records(log_file, since):
+    """Yield log records newer than since, oldest rotated file first"""
+    paths = [f"{log_file}.{index}" for index in range(EXECUTION_LOG_BACKUPS, 0, -1)] + [log_file]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    timestamp = datetime.fromisoformat(record['timestamp'])
+                except (ValueError, KeyError):
+                    continue
+                if timestamp >= since:
+                    yield record
+
+def group_records(records, key):
+    """Aggregate runs, CPU, duration and timeouts per key"""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(key(record), {
+            'runs': 0, 'cpu_time': 0.0, 'duration': 0.0, 'max_duration': 0.0, 'timeouts': 0
+        })
+        group['runs'] += 1
+        group['cpu_time'] += record.get('cpu_time', 0.0)
+        group['duration'] += record.get('duration', 0.0)
+        group['max_duration'] = max(group['max_duration'], record.get('duration', 0.0))
+        if record.get('exit_reason') == 'timeout':
+            group['timeouts'] += 1
+    return groups
+
+def report_users(records, top):
+    """Top users by total CPU time"""
+    rows = []
+    for user, group in group_records(records, lambda r: r.get('user')).items():
+        rows.append({
+            'user': user,
+            'runs': group['runs'],
+            'cpu_time': round(group['cpu_time'], 3),
+            'avg_cpu_time': round(group['cpu_time'] / group['runs'], 3)
+        })
+    rows.sort(key=lambda row: row['cpu_time'], reverse=True)
+    return rows[:top]
+
+def report_timeouts(records, top):
+    """Timeout rate overall and for the users who hit timeouts most"""
+    rows = []
+    groups = group_records(records, lambda r: r.get('user'))
+    total_runs = sum(group['runs'] for group in groups.values())
+    total_timeouts = sum(group['timeouts'] for group in groups.values())
+    for user, group in groups.items():
+        rows.append({
+            'user': user,
+            'runs': group['runs'],
+            'timeouts': group['timeouts'],
+            'timeout_rate': round(group['timeouts'] / group['runs'], 3)
+        })
+    rows.sort(key=lambda row: (row['timeouts'], row['timeout_rate']), reverse=True)
+    rows = rows[:top]
+    rows.append({
+        'user': '(all)',
+        'runs': total_runs,
+        'timeouts': total_timeouts,
+        'timeout_rate': round(total_timeouts / total_runs, 3) if total_runs else 0.0
+    })
+    return rows
+
+def report_apps(records, top):
+    """Slowest apps by average duration; unsaved code is grouped by its hash"""
+    rows = []
+    groups = group_records(records, lambda r: (r.get('user'), r.get('app_id') or f"code:{r.get('code_hash')}"))
+    for (user, app), group in groups.items():
+        rows.append({
+            'user': user,
+            'app': app,
+            'runs': group['runs'],
+            'avg_duration': round(group['duration'] / group['runs'], 3),
+            'max_duration': round(group['max_duration'], 3)
+        })
+    rows.sort(key=lambda row: row['avg_duration'], reverse=True)
+    return rows[:top]
+
+REPORTS = {
+    'users': report_users,
+    'timeouts': report_timeouts,
+    'apps': report_apps
+}
+
+def print_table(rows):
+    """Print rows as an aligned text table"""
+    if not rows:
+        print("No executions in this time window.")
+        return
+    columns = list(rows[0].keys())
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    print('  '.join('-' * widths[column] for column in columns))
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(widths[column]) for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on sandbox executions")
+    parser.add_argument('report', choices=sorted(REPORTS), help="which report to run")
+    parser.add_argument('--since', type=parse_since, default='24h',
+                        help="time window: 30m, 24h, 7d or an ISO timestamp (default: 24h)")
+    parser.add_argument('--top', type=int, default=10, help="number of rows (default: 10)")
+    parser.add_argument('--log-file', default=EXECUTION_LOG_FILE, help="execution log path")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    rows = REPORTS[args.report](read_records(args.log_file, args.since), args.top)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(rows)
+
+if __name__ == '__main__':
+    main()
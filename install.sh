@@ -65,6 +65,8 @@ echo "📄 Copying application files..."
 cp codesandbox_backend.py $APP_DIR/
 cp codesandbox.html $APP_DIR/
 cp login.html $APP_DIR/
+cp execution_profiles.json $APP_DIR/
+cp execution_log_report.py $APP_DIR/
 cp README.md $APP_DIR/
 
 # Create systemd service
@@ -3,6 +3,6 @@
 # Start nginx in the background
 nginx &
 
-# Start the Flask application
+# Start the Flask application (exec so it receives SIGTERM and can drain running jobs)
 cd /root
-python3 codesandbox_backend.py
+exec python3 codesandbox_backend.py
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Test script for the backend features beyond the basic apps workflow.
+
+One check per feature, run in order against a running server:
+- precompiled bytecode for saved apps
+- compressed responses and stored HTML views
+- app export/import
+- execution profiles and the admin profile policy
+- conditional app requests and write deltas
+- profiled runs
+- the execution log
+"""
+import requests
+import json
+import os
+import time
+import hashlib
+import tempfile
+from datetime import datetime
+
+BASE_URL = "http://localhost:7111"
+# Server-side paths, checked when the tests run on the same host as the backend
+BYTECODE_CACHE_DIR = '/tmp/app_bytecode'
+EXECUTION_LOG_FILE = '/tmp/sandbox_logs/executions.jsonl'
+
+def login():
+    session = requests.Session()
+    login_response = session.post(f"{BASE_URL}/login", json={
+        'username': 'admin',
+        'password': 'admin'
+    })
+
+    if login_response.status_code != 200:
+        print(f"❌ Login failed: {login_response.status_code}")
+        return None
+
+    return session
+
+def test_bytecode_cache(session):
+    print("🧪 Testing precompiled saved apps...")
+    code = "x = 6 * 7\nprint(x)\nprint(sorted(name for name in globals() if not name.startswith('__')))"
+
+    # 1. Two apps with the same code share one cache file
+    print("1. Saving two apps with identical code...")
+    cache_before = set(os.listdir(BYTECODE_CACHE_DIR)) if os.path.isdir(BYTECODE_CACHE_DIR) else None
+    app_ids = []
+    for name in ('Cache Test A', 'Cache Test B'):
+        save_response = session.post(f"{BASE_URL}/apps", json={'name': name, 'code': code})
+        if save_response.status_code != 200:
+            print(f"❌ App save failed: {save_response.status_code}")
+            return False
+        app_ids.append(save_response.json()['app_id'])
+    if cache_before is not None:
+        new_files = set(os.listdir(BYTECODE_CACHE_DIR)) - cache_before
+        if len([f for f in new_files if f.endswith('.marshal')]) > 1:
+            print(f"❌ Expected at most one new cache file, found {new_files}")
+            return False
+    print("✅ Apps saved")
+
+    # 2. Deleting one app leaves the other runnable from its cached object, with the same
+    #    globals as a run from source
+    print("2. Running the remaining app from its cached object...")
+    session.delete(f"{BASE_URL}/apps/{app_ids[0]}")
+    cached_output = session.post(f"{BASE_URL}/run", json={'app_id': app_ids[1], 'code': ''}).json().get('output')
+    source_output = session.post(f"{BASE_URL}/run", json={'code': code}).json().get('output')
+    if not cached_output or not cached_output.startswith('42\n') or cached_output != source_output:
+        print(f"❌ Cached run differs from source run: {cached_output!r} vs {source_output!r}")
+        return False
+    print("✅ Cached run matches the source run")
+
+    # 3. Code that cannot be compiled within the limits still saves, and runs from source
+    print("3. Saving an app too large to precompile...")
+    save_response = session.post(f"{BASE_URL}/apps", json={'name': 'Cache Test C', 'code': 'x=' + '-' * 200000 + '1'})
+    if save_response.status_code != 200:
+        print(f"❌ App save failed: {save_response.status_code}")
+        return False
+    print("✅ Oversized app saved")
+
+    session.delete(f"{BASE_URL}/apps/{app_ids[1]}")
+    session.delete(f"{BASE_URL}/apps/{save_response.json()['app_id']}")
+    return True
+
+def test_compression(session):
+    print("🧪 Testing response compression...")
+
+    # 1. Large JSON responses are gzipped only for clients that accept it
+    print("1. Testing gzip negotiation on the apps list...")
+    save_response = session.post(f"{BASE_URL}/apps", json={
+        'name': 'Compression Test', 'description': 'x' * 4000, 'code': 'print(1)'
+    })
+    app_id = save_response.json()['app_id']
+    gzip_response = session.get(f"{BASE_URL}/apps", headers={'Accept-Encoding': 'gzip'})
+    plain_response = session.get(f"{BASE_URL}/apps", headers={'Accept-Encoding': 'identity'})
+    session.delete(f"{BASE_URL}/apps/{app_id}")
+    if gzip_response.headers.get('Content-Encoding') != 'gzip':
+        print(f"❌ Expected a gzipped apps list, got {gzip_response.headers.get('Content-Encoding')}")
+        return False
+    if 'Content-Encoding' in plain_response.headers or gzip_response.json() != plain_response.json():
+        print("❌ Uncompressed apps list differs or was still compressed")
+        return False
+    print("✅ Apps list compressed only when accepted")
+
+    # 2. HTML views are stored compressed and served as-is or decompressed
+    print("2. Testing compressed HTML views...")
+    run_response = session.post(f"{BASE_URL}/run", json={
+        'code': 'print("<html><body><h1>Compressed view</h1></body></html>")'
+    })
+    html_url = run_response.json().get('html_url')
+    if not html_url:
+        print(f"❌ No HTML view created: {run_response.json()}")
+        return False
+    gzip_response = session.get(f"{BASE_URL}{html_url}", headers={'Accept-Encoding': 'gzip'})
+    plain_response = session.get(f"{BASE_URL}{html_url}", headers={'Accept-Encoding': 'identity'})
+    if gzip_response.headers.get('Content-Encoding') != 'gzip' or 'Content-Encoding' in plain_response.headers:
+        print("❌ HTML view encoding doesn't follow Accept-Encoding")
+        return False
+    if 'Compressed view' not in plain_response.text or gzip_response.text != plain_response.text:
+        print("❌ HTML view content differs between encodings")
+        return False
+    print("✅ HTML view served for both encodings")
+    return True
+
+def test_export_import(session):
+    print("🧪 Testing app export/import...")
+
+    # 1. Save an app to export
+    print("1. Saving an app...")
+    save_response = session.post(f"{BASE_URL}/apps", json={
+        'name': 'Export Test',
+        'description': 'Round trip',
+        'code': 'print("exported")'
+    })
+    if save_response.status_code != 200:
+        print(f"❌ App save failed: {save_response.status_code}")
+        return False
+    app_id = save_response.json()['app_id']
+    print("✅ App saved")
+
+    # 2. Export and find the app in the archive
+    print("2. Testing export...")
+    export_response = session.get(f"{BASE_URL}/apps/export")
+    if export_response.status_code != 200:
+        print(f"❌ Export failed: {export_response.status_code}")
+        return False
+
+    exported = [json.loads(line) for line in export_response.text.splitlines() if line.strip()]
+    exported = [app for app in exported if app['id'] == app_id]
+    if len(exported) != 1:
+        print("❌ Saved app missing from export")
+        return False
+    print("✅ Export contains the app")
+
+    apps_before = session.get(f"{BASE_URL}/apps").json()['total']
+
+    # 3. A bad line rejects the whole archive
+    print("3. Testing import with an invalid line...")
+    archive = json.dumps(exported[0]) + '\n{not json\n'
+    import_response = session.post(f"{BASE_URL}/apps/import", data=archive)
+    if import_response.status_code != 400:
+        print(f"❌ Expected 400 for an invalid line, got {import_response.status_code}")
+        return False
+    print("✅ Invalid line rejected")
+
+    # 4. A created_at that is not a timestamp string is rejected too
+    print("4. Testing import with an invalid created_at...")
+    bad_app = dict(exported[0], created_at=5)
+    import_response = session.post(f"{BASE_URL}/apps/import", data=json.dumps(bad_app) + '\n')
+    if import_response.status_code != 400:
+        print(f"❌ Expected 400 for an invalid created_at, got {import_response.status_code}")
+        return False
+
+    # 5. Fields of the wrong type are rejected rather than stored as text
+    print("5. Testing import with non-string fields...")
+    bad_app = {'name': None, 'code': {'a': 1}, 'description': None}
+    import_response = session.post(f"{BASE_URL}/apps/import", data=json.dumps(bad_app) + '\n')
+    if import_response.status_code != 400:
+        print(f"❌ Expected 400 for non-string fields, got {import_response.status_code}")
+        return False
+
+    apps_response = session.get(f"{BASE_URL}/apps")
+    if apps_response.status_code != 200 or apps_response.json()['total'] != apps_before:
+        print("❌ Rejected imports changed the app list")
+        return False
+    print("✅ Invalid created_at and non-string fields rejected, nothing imported")
+
+    # 6. A valid archive imports every app
+    print("6. Testing import round trip...")
+    import_response = session.post(f"{BASE_URL}/apps/import", data=json.dumps(exported[0]) + '\n')
+    if import_response.status_code != 200:
+        print(f"❌ Import failed: {import_response.status_code}")
+        print(f"Response: {import_response.text}")
+        return False
+
+    imported_id = import_response.json()['app_ids'][0]
+    imported = session.get(f"{BASE_URL}/apps/{imported_id}").json()['app']
+    for field in ('name', 'description', 'code', 'created_at', 'profile'):
+        if imported[field] != exported[0][field]:
+            print(f"❌ Imported {field} doesn't match the export")
+            return False
+    print("✅ Import round trip successful")
+
+    session.delete(f"{BASE_URL}/apps/{app_id}")
+    session.delete(f"{BASE_URL}/apps/{imported_id}")
+    return True
+
+def test_execution_profiles(session):
+    print("🧪 Testing execution profiles...")
+
+    # 1. The admin sees every profile from execution_profiles.json
+    print("1. Testing available profiles...")
+    status = session.get(f"{BASE_URL}/status").json()
+    if not {'quick', 'standard', 'heavy'} <= set(status.get('profiles', [])):
+        print(f"❌ Unexpected profiles: {status.get('profiles')}")
+        return False
+    print("✅ Profiles listed")
+
+    # 2. Each profile applies its own limits
+    print("2. Testing per-profile timeouts...")
+    code = 'import time\nstart = time.time()\nwhile time.time() - start < 3:\n    pass\nprint("finished")'
+    quick_output = session.post(f"{BASE_URL}/run", json={'code': code, 'profile': 'quick'}).json().get('output', '')
+    standard_output = session.post(f"{BASE_URL}/run", json={'code': code, 'profile': 'standard'}).json().get('output', '')
+    if 'timed out' not in quick_output or standard_output.strip() != 'finished':
+        print(f"❌ Unexpected outputs: {quick_output!r}, {standard_output!r}")
+        return False
+    if session.post(f"{BASE_URL}/run", json={'code': 'print(1)', 'profile': 'missing'}).status_code != 400:
+        print("❌ Unknown profile was accepted")
+        return False
+    print("✅ Profiles apply their own timeouts")
+
+    # 3. Saved apps remember their profile
+    print("3. Testing saved app profile...")
+    app_id = session.post(f"{BASE_URL}/apps", json={'name': 'Profile Test', 'code': 'print(1)', 'profile': 'quick'}).json()['app_id']
+    saved_profile = session.get(f"{BASE_URL}/apps/{app_id}").json()['app']['profile']
+    session.delete(f"{BASE_URL}/apps/{app_id}")
+    if saved_profile != 'quick':
+        print(f"❌ Saved app has profile {saved_profile}")
+        return False
+    print("✅ Saved app keeps its profile")
+
+    # 4. The admin policy must keep the default profile and only name known profiles
+    print("4. Testing the admin profile policy...")
+    settings = session.get(f"{BASE_URL}/app-settings").json()['settings']
+    original = settings['allowed_profiles']
+    for allowed in (['quick'], ['standard', 'missing']):
+        if session.post(f"{BASE_URL}/app-settings", json={'allowed_profiles': allowed}).status_code != 400:
+            print(f"❌ Invalid policy {allowed} was accepted")
+            return False
+    session.post(f"{BASE_URL}/app-settings", json={'allowed_profiles': ['standard', 'heavy']})
+    updated = session.get(f"{BASE_URL}/app-settings").json()['settings']['allowed_profiles']
+    session.post(f"{BASE_URL}/app-settings", json={'allowed_profiles': original})
+    if sorted(updated) != ['heavy', 'standard']:
+        print(f"❌ Policy not updated: {updated}")
+        return False
+    print("✅ Admin profile policy validated and applied")
+    return True
+
+def test_conditional_requests(session):
+    print("🧪 Testing conditional app requests and deltas...")
+
+    # 1. Unchanged list answers 304
+    print("1. Testing If-None-Match on the apps list...")
+    apps_response = session.get(f"{BASE_URL}/apps")
+    etag = apps_response.headers.get('ETag')
+    if not etag:
+        print("❌ Apps list has no ETag")
+        return False
+
+    cached_response = session.get(f"{BASE_URL}/apps", headers={'If-None-Match': etag})
+    if cached_response.status_code != 304:
+        print(f"❌ Expected 304, got {cached_response.status_code}")
+        return False
+    print("✅ Unchanged apps list returns 304")
+
+    # 2. A save returns a delta and invalidates the ETag
+    print("2. Testing save delta...")
+    save_response = session.post(f"{BASE_URL}/apps", json={'name': 'Delta Test', 'code': 'print(1)'})
+    save_data = save_response.json()
+    app_id = save_data['app_id']
+    delta = save_data.get('delta', {})
+    if [app['id'] for app in delta.get('upserted', [])] != [app_id] or delta.get('deleted'):
+        print(f"❌ Unexpected save delta: {delta}")
+        return False
+    if f'W/"{delta["previous_etag"]}"' != etag:
+        print("❌ Delta previous_etag doesn't match the cached list")
+        return False
+
+    changed_response = session.get(f"{BASE_URL}/apps", headers={'If-None-Match': etag})
+    if changed_response.status_code != 200:
+        print(f"❌ Expected 200 after a save, got {changed_response.status_code}")
+        return False
+    if changed_response.headers.get('ETag') != f'W/"{delta["apps_etag"]}"':
+        print("❌ New ETag doesn't match the delta's apps_etag")
+        return False
+    print("✅ Save delta and new ETag are consistent")
+
+    # 3. App details answer 304 until the app changes
+    print("3. Testing If-None-Match on app details...")
+    app_etag = session.get(f"{BASE_URL}/apps/{app_id}").headers.get('ETag')
+    if session.get(f"{BASE_URL}/apps/{app_id}", headers={'If-None-Match': app_etag}).status_code != 304:
+        print("❌ Unchanged app didn't return 304")
+        return False
+
+    update_response = session.put(f"{BASE_URL}/apps/{app_id}", json={
+        'name': 'Delta Test', 'code': 'print(2)', 'description': None
+    })
+    if update_response.status_code != 200:
+        print(f"❌ App update failed: {update_response.status_code}")
+        return False
+    if session.get(f"{BASE_URL}/apps/{app_id}", headers={'If-None-Match': app_etag}).status_code != 200:
+        print("❌ Updated app still returned 304")
+        return False
+    print("✅ App details revalidate correctly")
+
+    # 4. A delete returns a delta with the deleted id
+    print("4. Testing delete delta...")
+    delete_data = session.delete(f"{BASE_URL}/apps/{app_id}").json()
+    if delete_data.get('delta', {}).get('deleted') != [app_id]:
+        print(f"❌ Unexpected delete delta: {delete_data.get('delta')}")
+        return False
+    print("✅ Delete delta successful")
+
+    # 5. Paging returns the requested slice and rejects negative values
+    print("5. Testing limit/offset paging...")
+    apps_data = session.get(f"{BASE_URL}/apps").json()
+    page_data = session.get(f"{BASE_URL}/apps", params={'offset': 1, 'limit': 1}).json()
+    if page_data['apps'] != apps_data['apps'][1:2] or page_data['total'] != apps_data['total']:
+        print(f"❌ Unexpected page: {page_data}")
+        return False
+    for params in ({'offset': -5}, {'limit': -1}):
+        if session.get(f"{BASE_URL}/apps", params=params).status_code != 400:
+            print(f"❌ Expected 400 for {params}")
+            return False
+    print("✅ Paging successful")
+    return True
+
+def test_profiled_run(session):
+    print("🧪 Testing profiled run...")
+    # Walk every frame reachable from user code looking for the profiler, the report marker
+    # or unrestricted builtins
+    code = '''def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+print(fib(15))
+leaks = []
+frame = sys._getframe()
+while frame is not None:
+    values = list(frame.f_globals.values())
+    if frame.f_code.co_name != '<module>':
+        values += list(frame.f_locals.values())
+    frame_builtins = frame.f_globals.get('__builtins__', {})
+    if 'open' in (frame_builtins if isinstance(frame_builtins, dict) else vars(frame_builtins)):
+        leaks.append(frame.f_code.co_name + ' builtins')
+    for value in values:
+        if type(value).__name__ == 'Profiler' or ('__sandbox' + '_profile_') in repr(value):
+            leaks.append(frame.f_code.co_name + ' profiler')
+    frame = frame.f_back
+if hasattr(sys, 'getprofile') or hasattr(sys, '_current_frames'):
+    leaks.append('sys hooks')
+print(leaks or 'clean')'''
+
+    run_response = session.post(f"{BASE_URL}/run", json={'code': code, 'profiling': True})
+    if run_response.status_code != 200:
+        print(f"❌ Run failed: {run_response.status_code}")
+        return False
+
+    run_data = run_response.json()
+    if run_data.get('output', '').split() != ['610', 'clean']:
+        print(f"❌ Unexpected output: {run_data.get('output')}")
+        return False
+
+    report = run_data.get('profile_report')
+    if not report or not report['functions']:
+        print(f"❌ Missing profile report: {report}")
+        return False
+    if report['functions'][0]['function'] != 'fib (line 1)':
+        print(f"❌ Expected fib first in the report, got {report['functions'][0]}")
+        return False
+    print("✅ Profiled run reports fib and no frame reachable from user code exposes the profiler")
+    return True
+
+def find_log_record(code, timeout=5):
+    """Wait for the log writer to record a run of this code and return the record"""
+    code_hash = hashlib.sha256(code.encode()).hexdigest()[:16]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(EXECUTION_LOG_FILE):
+            with open(EXECUTION_LOG_FILE, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get('code_hash') == code_hash:
+                        return record
+        time.sleep(0.2)
+    return None
+
+def test_execution_log(session):
+    print("🧪 Testing the execution log...")
+    if not os.path.isdir(os.path.dirname(EXECUTION_LOG_FILE)):
+        print("⚠️ Execution log not found on this host, skipping")
+        return True
+
+    # 1. Every run is recorded with its profile and exit reason
+    print("1. Testing run records...")
+    marker = datetime.now().isoformat()
+    ok_code = f'print("log test {marker}")'
+    timeout_code = f'# log test {marker}\nwhile True:\n    pass'
+    session.post(f"{BASE_URL}/run", json={'code': ok_code})
+    session.post(f"{BASE_URL}/run", json={'code': timeout_code, 'profile': 'quick'})
+
+    ok_record = find_log_record(ok_code)
+    timeout_record = find_log_record(timeout_code)
+    if not ok_record or ok_record['exit_reason'] != 'ok' or ok_record['user'] != 'admin' \
+            or ok_record['profile'] != 'standard' or ok_record['output_size'] <= 0:
+        print(f"❌ Unexpected record for a normal run: {ok_record}")
+        return False
+    if not timeout_record or timeout_record['exit_reason'] != 'timeout' or timeout_record['profile'] != 'quick':
+        print(f"❌ Unexpected record for a timed-out run: {timeout_record}")
+        return False
+    print("✅ Runs recorded with profile and exit reason")
+
+    # 2. The writer rotates the log at its size limit and the report CLI reads the backups
+    print("2. Testing log rotation...")
+    import codesandbox_backend as backend
+    from execution_log_report import read_records
+    with tempfile.TemporaryDirectory() as log_dir:
+        backend.EXECUTION_LOG_FILE = os.path.join(log_dir, 'executions.jsonl')
+        backend.EXECUTION_LOG_MAX_BYTES = 500
+        for index in range(20):
+            backend.log_execution({'timestamp': datetime.now().isoformat(), 'user': 'rotation', 'run': index})
+        backend.stop_execution_log()
+        records = list(read_records(backend.EXECUTION_LOG_FILE, datetime.min))
+        if not os.path.exists(f"{backend.EXECUTION_LOG_FILE}.1") or [r['run'] for r in records] != list(range(20)):
+            print(f"❌ Rotation lost or reordered records: {os.listdir(log_dir)}")
+            return False
+    print("✅ Log rotated without losing records")
+    return True
+
+FEATURE_TESTS = [
+    test_bytecode_cache,
+    test_compression,
+    test_export_import,
+    test_execution_profiles,
+    test_conditional_requests,
+    test_profiled_run,
+    test_execution_log
+]
+
+if __name__ == "__main__":
+    try:
+        session = login()
+        # Run every check even after a failure, so one broken feature doesn't hide the others
+        success = session is not None and all([test(session) for test in FEATURE_TESTS])
+        if success:
+            print("\n🎉 All tests passed!")
+        exit(0 if success else 1)
+    except Exception as e:
+        print(f"❌ Test failed with exception: {e}")
+        exit(1)